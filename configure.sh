@@ -55,7 +55,7 @@ monitoring:
   service_name: "$service_name"
   check_interval: 300
   alert_cooldown: 3600
-  state_file: "/var/lib/squid-monitor/state.json"
+  state_file: "/var/lib/squid-monitor/state.bin"
   log_file: "/var/log/squid-monitor/monitor.log"
   log_level: "INFO"
 
@@ -8,66 +8,398 @@ import os
 import sys
 import time
 import json
-import yaml
+import copy
 import socket
+import string
+import struct
 import logging
 import logging.handlers
-import argparse
+import atexit
+import signal
 import subprocess
-import smtplib
-import uuid
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import itertools
+import functools
+from dataclasses import dataclass, fields, replace
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import argparse
+    import smtplib
+    from concurrent.futures import Executor
+
+try:
+    from pystemd.systemd1 import Unit as SystemdUnit
+except ImportError:  # Fall back to systemctl
+    SystemdUnit = None
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
 
 __version__ = "1.0.0"
 
+# Resolved once; the hostname does not change during a run
+HOSTNAME = socket.gethostname()
+
+# Correlation ids count up from a random per-process seed
+_correlation_ids = itertools.count(int.from_bytes(os.urandom(8), 'big'))
+
+def new_correlation_id() -> str:
+    """Return a fresh 16-hex-digit correlation id"""
+    return f"{next(_correlation_ids) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+# Signals consumed synchronously by the continuous monitoring loop
+LOOP_SIGNALS = {signal.SIGTERM, signal.SIGINT, signal.SIGHUP}
+
+# Fixed-size binary state record: magic, last_check, last_status (-1 unknown),
+# last_alert_time, consecutive_failures, last_success_time. Timestamps are
+# epoch nanoseconds, 0 when unset.
+STATE_MAGIC = b'SQM1'
+STATE_RECORD = struct.Struct('!4sQbQIQ')
+STATE_TIMESTAMPS = ('last_check', 'last_alert_time', 'last_success_time')
+
+# Unit states that systemctl is-active reports as running (exit status 0)
+ACTIVE_UNIT_STATES = ('active', 'reloading')
+
+# Upper bound on journal output included in an alert
+MAX_LOG_BYTES = 64 * 1024
+
+# Reuse system statistics gathered within this many seconds
+STATS_CACHE_TTL = 30
+
+# Recycle the persistent SMTP connection after this many messages
+SMTP_MAX_MESSAGES_PER_CONNECTION = 10000
+
+# Stop trying SMTP for an alert cooldown after this many consecutive failed alerts
+SMTP_CIRCUIT_THRESHOLD = 2
+
+# Longest single pause between SMTP retries, in seconds
+SMTP_MAX_BACKOFF = 30
+
+# Built-in settings, overridden by the environment and then the config file
+DEFAULT_CONFIG = {
+    'smtp': {
+        'server': 'smtp.example.com',
+        'port': 25,
+        'use_tls': False,
+        'username': '',
+        'password': '',
+        'from_address': 'squid-noreply@example.com',
+        'to_addresses': ('admin@example.com',),
+        'timeout': 30,
+        'pipelining': False,
+        'dns_cache': False
+    },
+    'monitoring': {
+        'service_name': 'squid',
+        'check_interval': 300,
+        'state_file': '/var/lib/squid-monitor/state.bin',
+        'log_file': '/var/log/squid-monitor/monitor.log',
+        'log_level': 'INFO',
+        'alert_cooldown': 3600,
+        'retry_attempts': 3,
+        'retry_delay': 5
+    },
+    'features': {
+        'dry_run': False,
+        'enable_syslog': True,
+        'enable_webhooks': False,
+        'webhook_url': ''
+    }
+}
+
+def _env_bool(value: str) -> bool:
+    """Parse a true/false environment variable"""
+    return value.lower() == 'true'
+
+def _env_list(value: str) -> List[str]:
+    """Parse a comma-separated environment variable, skipping blank items"""
+    return [item for item in map(str.strip, value.split(',')) if item]
+
+# Environment variables that override the built-in defaults:
+# (variable, config section, key, parser)
+ENV_OVERRIDES = (
+    ('SMTP_SERVER', 'smtp', 'server', str),
+    ('SMTP_PORT', 'smtp', 'port', int),
+    ('SMTP_USE_TLS', 'smtp', 'use_tls', _env_bool),
+    ('SMTP_USERNAME', 'smtp', 'username', str),
+    ('SMTP_PASSWORD', 'smtp', 'password', str),
+    ('SMTP_FROM', 'smtp', 'from_address', str),
+    ('SMTP_TO', 'smtp', 'to_addresses', _env_list),
+    ('SMTP_TIMEOUT', 'smtp', 'timeout', int),
+    ('SMTP_PIPELINING', 'smtp', 'pipelining', _env_bool),
+    ('SMTP_DNS_CACHE', 'smtp', 'dns_cache', _env_bool),
+    ('SERVICE_NAME', 'monitoring', 'service_name', str),
+    ('CHECK_INTERVAL', 'monitoring', 'check_interval', int),
+    ('STATE_FILE', 'monitoring', 'state_file', str),
+    ('LOG_FILE', 'monitoring', 'log_file', str),
+    ('LOG_LEVEL', 'monitoring', 'log_level', str),
+    ('ALERT_COOLDOWN', 'monitoring', 'alert_cooldown', int),
+    ('RETRY_ATTEMPTS', 'monitoring', 'retry_attempts', int),
+    ('RETRY_DELAY', 'monitoring', 'retry_delay', int),
+    ('DRY_RUN', 'features', 'dry_run', _env_bool),
+    ('ENABLE_SYSLOG', 'features', 'enable_syslog', _env_bool),
+    ('ENABLE_WEBHOOKS', 'features', 'enable_webhooks', _env_bool),
+    ('WEBHOOK_URL', 'features', 'webhook_url', str)
+)
+
+# Translation tables that delete every character allowed in each address part
+_LOCAL_PART_CHARS = str.maketrans('', '', string.ascii_letters + string.digits + '._%+-')
+_DOMAIN_CHARS = str.maketrans('', '', string.ascii_letters + string.digits + '.-')
+
+def _is_email(address: str) -> bool:
+    """Check that an address has the local-part@domain.tld shape"""
+    at = address.find('@')
+    dot = address.rfind('.')
+    return (0 < at and at + 1 < dot < len(address) - 2
+            and not address[:at].translate(_LOCAL_PART_CHARS)
+            and not address[at + 1:].translate(_DOMAIN_CHARS)
+            and address[dot + 1:].isalpha())
+
+def _json_dumps(obj, indent: bool = False) -> str:
+    """Serialize to JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None).decode()
+    return json.dumps(obj, indent=2 if indent else None)
+
+def _json_loads(data: bytes):
+    """Parse JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _open_proc(path: str) -> Optional[int]:
+    """Open a /proc file for repeated pread calls, if available"""
+    try:
+        return os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+def _meminfo_kb(meminfo: bytes, key: bytes) -> Optional[int]:
+    """Extract a single kB value from raw /proc/meminfo contents"""
+    start = meminfo.find(key)
+    if start < 0:
+        return None
+    start += len(key)
+    return int(meminfo[start:meminfo.find(b'\n', start)].split()[0])
+
+@functools.lru_cache(maxsize=None)
+def _pipelined_smtp_class() -> type:
+    """Build PipelinedSMTP on first use so smtplib is only loaded when mailing"""
+    import re
+    import smtplib
+    
+    class PipelinedSMTP(smtplib.SMTP):
+        """SMTP client that pipelines the envelope commands (RFC 2920)"""
+        
+        def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+            """Send MAIL, RCPT and DATA in a single write when the server allows it"""
+            self.ehlo_or_helo_if_needed()
+            if not self.has_extn('pipelining') or mail_options or rcpt_options:
+                return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+            
+            if isinstance(to_addrs, str):
+                to_addrs = [to_addrs]
+            if isinstance(msg, str):
+                msg = re.sub(r'(?:\r\n|\n|\r(?!\n))', smtplib.CRLF, msg).encode('ascii')
+            
+            commands = [f"mail FROM:{smtplib.quoteaddr(from_addr)}"]
+            commands.extend(f"rcpt TO:{smtplib.quoteaddr(addr)}" for addr in to_addrs)
+            commands.append("data")
+            self.send(''.join(command + smtplib.CRLF for command in commands))
+            
+            # Replies arrive in command order
+            code, resp = self.getreply()
+            senderrs = {}
+            for addr in to_addrs:
+                rcpt_code, rcpt_resp = self.getreply()
+                if rcpt_code not in (250, 251):
+                    senderrs[addr] = (rcpt_code, rcpt_resp)
+            data_code, data_resp = self.getreply()
+            
+            if code != 250:
+                self._rset()
+                raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+            if len(senderrs) == len(to_addrs):
+                self._rset()
+                raise smtplib.SMTPRecipientsRefused(senderrs)
+            if data_code != 354:
+                self._rset()
+                raise smtplib.SMTPDataError(data_code, data_resp)
+            
+            body = re.sub(br'(?m)^\.', b'..', msg)
+            if not body.endswith(b'\r\n'):
+                body += b'\r\n'
+            self.send(body + b'.\r\n')
+            code, resp = self.getreply()
+            if code != 250:
+                self._rset()
+                raise smtplib.SMTPDataError(code, resp)
+            
+            return senderrs
+    
+    return PipelinedSMTP
+
+def __getattr__(name: str):
+    """Resolve lazily built module attributes"""
+    if name == 'PipelinedSMTP':
+        return _pipelined_smtp_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Alert bodies; only the per-alert fields are substituted
+TEXT_ALERT_TEMPLATE = """
+{alert_type} ALERT: {service_name} Service Monitoring
+
+Timestamp: {timestamp}
+Hostname: {hostname}
+Service: {service_name}
+Status: {status}
+
+System Statistics:
+- CPU Usage: {cpu_usage}%
+- Memory Usage: {memory_usage}%
+- Disk Usage: {disk_usage}
+
+Recent Service Logs:
+{logs}
+
+---
+This is an automated alert from Squid Monitor v{version}
+"""
+
+HTML_ALERT_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; color: #333; }}
+        .header {{ background-color: {alert_color}; color: white; padding: 20px; }}
+        .content {{ padding: 20px; }}
+        .stats {{ background-color: #f8f9fa; padding: 15px; margin: 10px 0; }}
+        .logs {{ background-color: #f1f1f1; padding: 15px; margin: 10px 0; 
+                font-family: monospace; font-size: 12px; overflow-x: auto; }}
+        .footer {{ color: #666; font-size: 12px; padding: 10px; }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h2>{alert_type} ALERT: {service_name} Service</h2>
+    </div>
+    <div class="content">
+        <p><strong>Timestamp:</strong> {timestamp}</p>
+        <p><strong>Hostname:</strong> {hostname}</p>
+        <p><strong>Service:</strong> {service_name}</p>
+        <p><strong>Status:</strong> <code>{status}</code></p>
+        
+        <div class="stats">
+            <h3>System Statistics</h3>
+            <ul>
+                <li>CPU Usage: {cpu_usage}%</li>
+                <li>Memory Usage: {memory_usage}%</li>
+                <li>Disk Usage: {disk_usage}</li>
+            </ul>
+        </div>
+        
+        <div class="logs">
+            <h3>Recent Service Logs</h3>
+            <pre>{logs}</pre>
+        </div>
+    </div>
+    <div class="footer">
+        <p>This is an automated alert from Squid Monitor v{version}</p>
+    </div>
+</body>
+</html>
+"""
+
+@dataclass(frozen=True)
+class SmtpConfig:
+    """SMTP delivery settings"""
+    server: str
+    port: int
+    use_tls: bool
+    username: str
+    password: str
+    from_address: str
+    to_addresses: Tuple[str, ...]
+    timeout: int
+    pipelining: bool
+    dns_cache: bool
+
+@dataclass(frozen=True)
+class MonitoringConfig:
+    """Service check, state and logging settings"""
+    service_name: str
+    check_interval: int
+    state_file: str
+    log_file: str
+    log_level: str
+    alert_cooldown: int
+    retry_attempts: int
+    retry_delay: int
+
+@dataclass(frozen=True)
+class FeaturesConfig:
+    """Optional behaviour toggles"""
+    dry_run: bool
+    enable_syslog: bool
+    enable_webhooks: bool
+    webhook_url: str
+
+def _config_section(section: type, values: Dict):
+    """Build a config section from a dict, ignoring unknown keys"""
+    names = {field.name for field in fields(section)}
+    return section(**{key: value for key, value in values.items() if key in names})
+
+@functools.lru_cache(maxsize=32)
+def _parse_yaml(path: str, mtime_ns: int, size: int):
+    """Parse a YAML file; the stat fields are part of the cache key"""
+    import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:  # PyYAML built without libyaml
+        from yaml import SafeLoader
+    
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+def _load_yaml(path: str):
+    """Load a YAML file, reusing the parse while the file is unchanged"""
+    st = os.stat(path)
+    # Callers may mutate the result, so never hand out the cached object
+    return copy.deepcopy(_parse_yaml(os.path.abspath(path), st.st_mtime_ns, st.st_size))
+
 class Config:
     """Configuration management for the monitor"""
     
     def __init__(self, config_file: Optional[str] = None):
-        self.config = self._load_config(config_file)
+        config = self._load_config(config_file)
+        self.smtp = _config_section(SmtpConfig, dict(
+            config['smtp'], to_addresses=tuple(config['smtp']['to_addresses'])
+        ))
+        self.monitoring = _config_section(MonitoringConfig, config['monitoring'])
+        self.features = _config_section(FeaturesConfig, config['features'])
         self._validate_config()
     
     def _load_config(self, config_file: Optional[str]) -> Dict:
         """Load configuration from file and environment variables"""
-        config = {
-            'smtp': {
-                'server': os.getenv('SMTP_SERVER', 'smtp.example.com'),
-                'port': int(os.getenv('SMTP_PORT', '25')),
-                'use_tls': os.getenv('SMTP_USE_TLS', 'false').lower() == 'true',
-                'username': os.getenv('SMTP_USERNAME', ''),
-                'password': os.getenv('SMTP_PASSWORD', ''),
-                'from_address': os.getenv('SMTP_FROM', 'squid-noreply@example.com'),
-                'to_addresses': os.getenv('SMTP_TO', 'admin@example.com').split(','),
-                'timeout': int(os.getenv('SMTP_TIMEOUT', '30'))
-            },
-            'monitoring': {
-                'service_name': os.getenv('SERVICE_NAME', 'squid'),
-                'check_interval': int(os.getenv('CHECK_INTERVAL', '300')),
-                'state_file': os.getenv('STATE_FILE', '/var/lib/squid-monitor/state.json'),
-                'log_file': os.getenv('LOG_FILE', '/var/log/squid-monitor/monitor.log'),
-                'log_level': os.getenv('LOG_LEVEL', 'INFO'),
-                'alert_cooldown': int(os.getenv('ALERT_COOLDOWN', '3600')),
-                'retry_attempts': int(os.getenv('RETRY_ATTEMPTS', '3')),
-                'retry_delay': int(os.getenv('RETRY_DELAY', '5'))
-            },
-            'features': {
-                'dry_run': os.getenv('DRY_RUN', 'false').lower() == 'true',
-                'enable_syslog': os.getenv('ENABLE_SYSLOG', 'true').lower() == 'true',
-                'enable_webhooks': os.getenv('ENABLE_WEBHOOKS', 'false').lower() == 'true',
-                'webhook_url': os.getenv('WEBHOOK_URL', '')
-            }
-        }
+        # Two-level copy; default values themselves are immutable
+        config = {section: dict(values) for section, values in DEFAULT_CONFIG.items()}
+        
+        environ = os.environ
+        for name, section, key, parse in ENV_OVERRIDES:
+            value = environ.get(name)
+            if value is not None:
+                config[section][key] = parse(value)
         
         if config_file and Path(config_file).exists():
-            with open(config_file, 'r') as f:
-                file_config = yaml.safe_load(f)
-                if file_config:
-                    self._merge_config(config, file_config)
+            file_config = _load_yaml(config_file)
+            if file_config:
+                self._merge_config(config, file_config)
         
         return config
     
@@ -81,37 +413,70 @@ class Config:
     
     def _validate_config(self) -> None:
         """Validate configuration values"""
-        email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+        if not _is_email(self.smtp.from_address):
+            raise ValueError(f"Invalid from_address: {self.smtp.from_address}")
         
-        if not email_pattern.match(self.config['smtp']['from_address']):
-            raise ValueError(f"Invalid from_address: {self.config['smtp']['from_address']}")
+        if not self.smtp.to_addresses:
+            raise ValueError("No to_addresses configured")
         
-        for email in self.config['smtp']['to_addresses']:
-            if not email_pattern.match(email.strip()):
+        for email in self.smtp.to_addresses:
+            if not _is_email(email.strip()):
                 raise ValueError(f"Invalid to_address: {email}")
         
-        if self.config['smtp']['port'] not in range(1, 65536):
-            raise ValueError(f"Invalid SMTP port: {self.config['smtp']['port']}")
+        if self.smtp.port not in range(1, 65536):
+            raise ValueError(f"Invalid SMTP port: {self.smtp.port}")
+
+class JsonFormatter(logging.Formatter):
+    """Render each log record as a single JSON object"""
+    
+    def __init__(self):
+        super().__init__()
+        self._cached_time = (None, '')
+    
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        """Format the record time, reusing the strftime result within a second"""
+        second = int(record.created)
+        cached_second, text = self._cached_time
+        if second != cached_second:
+            text = time.strftime(self.default_time_format, self.converter(second))
+            self._cached_time = (second, text)
+        return self.default_msec_format % (text, record.msecs)
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'correlation_id': getattr(record, 'correlation_id', None),
+            'hostname': getattr(record, 'hostname', HOSTNAME),
+            'message': record.getMessage()
+        }
+        return _json_dumps(entry)
+
+class _ContextAdapter(logging.LoggerAdapter):
+    """Adds fixed context to the per-call extra fields"""
+    
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
 
 class Logger:
     """Structured logging with multiple outputs"""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Config):
         self.logger = logging.getLogger('squid-monitor')
-        self.logger.setLevel(getattr(logging, config['monitoring']['log_level']))
+        self.logger.setLevel(getattr(logging, config.monitoring.log_level))
+        # Handlers from a previous configuration hold open files and sockets
+        for handler in self.logger.handlers:
+            handler.close()
         self.logger.handlers = []
         
-        formatter = logging.Formatter(
-            '{"timestamp": "%(asctime)s", "level": "%(levelname)s", '
-            '"correlation_id": "%(correlation_id)s", "hostname": "%(hostname)s", '
-            '"message": "%(message)s"}'
-        )
+        formatter = JsonFormatter()
         
         # File handler
-        log_dir = Path(config['monitoring']['log_file']).parent
+        log_dir = Path(config.monitoring.log_file).parent
         log_dir.mkdir(parents=True, exist_ok=True)
         file_handler = logging.handlers.RotatingFileHandler(
-            config['monitoring']['log_file'],
+            config.monitoring.log_file,
             maxBytes=10*1024*1024,  # 10MB
             backupCount=5
         )
@@ -119,42 +484,109 @@ class Logger:
         self.logger.addHandler(file_handler)
         
         # Syslog handler
-        if config['features']['enable_syslog']:
+        if config.features.enable_syslog:
             syslog_handler = logging.handlers.SysLogHandler(address='/dev/log')
             syslog_handler.setFormatter(formatter)
             self.logger.addHandler(syslog_handler)
         
         # Console handler for debug mode
-        if config['monitoring']['log_level'] == 'DEBUG':
+        if config.monitoring.log_level == 'DEBUG':
             console_handler = logging.StreamHandler(sys.stdout)
             console_handler.setFormatter(formatter)
             self.logger.addHandler(console_handler)
+        
+        self._adapter = _ContextAdapter(self.logger, {'hostname': HOSTNAME})
     
-    def log(self, level: str, message: str, correlation_id: str) -> None:
-        """Log message with context"""
-        extra = {
-            'correlation_id': correlation_id,
-            'hostname': socket.gethostname()
-        }
-        getattr(self.logger, level.lower())(message, extra=extra)
+    def debug(self, message: str, correlation_id: str) -> None:
+        """Log a debug message with context"""
+        self._adapter.log(logging.DEBUG, message, extra={'correlation_id': correlation_id})
+    
+    def info(self, message: str, correlation_id: str) -> None:
+        """Log an info message with context"""
+        self._adapter.log(logging.INFO, message, extra={'correlation_id': correlation_id})
+    
+    def warning(self, message: str, correlation_id: str) -> None:
+        """Log a warning message with context"""
+        self._adapter.log(logging.WARNING, message, extra={'correlation_id': correlation_id})
+    
+    def error(self, message: str, correlation_id: str) -> None:
+        """Log an error message with context"""
+        self._adapter.log(logging.ERROR, message, extra={'correlation_id': correlation_id})
 
 class StateManager:
     """Manage monitoring state to prevent alert fatigue"""
     
-    def __init__(self, state_file: str):
+    def __init__(self, state_file: str, read_only: bool = False):
         self.state_file = Path(state_file)
-        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        self._read_only = read_only
+        if read_only:
+            # Inspection must not create the file, or it ends up owned by whoever ran it
+            try:
+                self._fd = os.open(self.state_file, os.O_RDONLY)
+            except FileNotFoundError:
+                self._fd = None
+        else:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o644)
+        self._truncate = False
+        self._dirty = False
         self.state = self._load_state()
+        atexit.register(self.close)
+    
+    def close(self) -> None:
+        """Write pending changes and close the state file"""
+        if self._fd is not None:
+            if not self._read_only:
+                self.flush()
+            os.close(self._fd)
+            self._fd = None
+        atexit.unregister(self.close)
+    
+    @staticmethod
+    def _to_ns(timestamp: Optional[float]) -> int:
+        """Convert an epoch timestamp to nanoseconds, 0 when unset"""
+        return 0 if timestamp is None else int(timestamp * 10**9)
+    
+    @staticmethod
+    def _from_ns(ns: int) -> Optional[float]:
+        """Convert epoch nanoseconds to a timestamp"""
+        return ns / 10**9 if ns else None
     
     def _load_state(self) -> Dict:
         """Load state from file"""
-        if self.state_file.exists():
-            try:
-                with open(self.state_file, 'r') as f:
-                    return json.load(f)
-            except Exception:
-                pass
+        data = os.pread(self._fd, 4096, 0) if self._fd is not None else b''
+        
+        if not data:
+            # Installs that predate the binary record kept state.json alongside
+            legacy_file = self.state_file.with_suffix('.json')
+            if legacy_file != self.state_file:
+                try:
+                    return self._parse_legacy(legacy_file.read_bytes())
+                except (OSError, ValueError):
+                    pass
         
+        if len(data) == STATE_RECORD.size and data.startswith(STATE_MAGIC):
+            _, last_check, last_status, last_alert, failures, last_success = STATE_RECORD.unpack(data)
+            return {
+                'last_check': self._from_ns(last_check),
+                'last_status': None if last_status < 0 else bool(last_status),
+                'last_alert_time': self._from_ns(last_alert),
+                'consecutive_failures': failures,
+                'last_success_time': self._from_ns(last_success)
+            }
+        
+        # Anything else is rewritten whole on the next save
+        self._truncate = bool(data)
+        try:
+            return self._parse_legacy(data)
+        except ValueError:
+            pass
+        
+        return self._default_state()
+    
+    @staticmethod
+    def _default_state() -> Dict:
+        """Return the state of a monitor that has not checked anything yet"""
         return {
             'last_check': None,
             'last_status': None,
@@ -163,10 +595,53 @@ class StateManager:
             'last_success_time': None
         }
     
+    @classmethod
+    def _parse_legacy(cls, data: bytes) -> Dict:
+        """Parse state written by JSON-based versions, with ISO timestamps"""
+        if not data.lstrip().startswith(b'{'):
+            raise ValueError("not JSON state")
+        try:
+            loaded = _json_loads(data)
+            # Fields missing from older files keep their defaults
+            state = cls._default_state()
+            state.update((key, loaded[key]) for key in state if key in loaded)
+            for key in STATE_TIMESTAMPS:
+                if isinstance(state[key], str):
+                    state[key] = datetime.fromisoformat(state[key]).timestamp()
+        except Exception as e:
+            raise ValueError(f"invalid JSON state: {e}") from e
+        return state
+    
     def save_state(self) -> None:
         """Save current state to file"""
-        with open(self.state_file, 'w') as f:
-            json.dump(self.state, f, indent=2)
+        last_status = self.state['last_status']
+        record = STATE_RECORD.pack(
+            STATE_MAGIC,
+            self._to_ns(self.state['last_check']),
+            -1 if last_status is None else int(last_status),
+            self._to_ns(self.state['last_alert_time']),
+            self.state['consecutive_failures'],
+            self._to_ns(self.state['last_success_time'])
+        )
+        os.pwrite(self._fd, record, 0)
+        if self._truncate:
+            os.ftruncate(self._fd, STATE_RECORD.size)
+            self._truncate = False
+        os.fdatasync(self._fd)
+        self._dirty = False
+    
+    def flush(self) -> None:
+        """Save state if it changed since the last save"""
+        if self._dirty:
+            self.save_state()
+    
+    def export_json(self) -> str:
+        """Render the current state as JSON with ISO timestamps"""
+        state = dict(self.state)
+        for key in STATE_TIMESTAMPS:
+            if state[key] is not None:
+                state[key] = datetime.fromtimestamp(state[key]).isoformat()
+        return _json_dumps(state, indent=True)
     
     def should_send_alert(self, current_status: bool, cooldown_seconds: int) -> bool:
         """Determine if an alert should be sent based on state"""
@@ -182,167 +657,373 @@ class StateManager:
             return True
         
         # Check cooldown period
-        if self.state['last_alert_time']:
-            last_alert = datetime.fromisoformat(self.state['last_alert_time'])
-            if datetime.now() - last_alert > timedelta(seconds=cooldown_seconds):
-                return True
-        
-        return False
+        last_alert_time = self.state['last_alert_time']
+        return last_alert_time is not None and time.time() - last_alert_time > cooldown_seconds
     
     def update_state(self, status: bool, alert_sent: bool = False) -> None:
         """Update state after check"""
-        self.state['last_check'] = datetime.now().isoformat()
+        now = time.time()
+        self.state['last_check'] = now
         self.state['last_status'] = status
         
         if status:
             self.state['consecutive_failures'] = 0
-            self.state['last_success_time'] = datetime.now().isoformat()
+            self.state['last_success_time'] = now
         else:
             self.state['consecutive_failures'] += 1
         
         if alert_sent:
-            self.state['last_alert_time'] = datetime.now().isoformat()
+            self.state['last_alert_time'] = now
         
-        self.save_state()
+        # Written by flush(), once per check
+        self._dirty = True
 
 class ServiceMonitor:
     """Core service monitoring functionality"""
     
     def __init__(self, config: Config, logger: Logger, state_manager: StateManager):
-        self.config = config.config
+        self.config = config
         self.logger = logger
         self.state_manager = state_manager
-        self.correlation_id = str(uuid.uuid4())
+        self.correlation_id = new_correlation_id()
+        self._smtp = None
+        self._smtp_sent = 0
+        self._smtp_consecutive_failures = 0
+        self._smtp_circuit_opened = 0.0
+        self._dns_cache: Dict[str, Tuple[float, str]] = {}
+        self._http = None
+        self._executor: Optional['Executor'] = None
+        self._units = {}
+        # journalctl output for the current check, keyed by (service, lines)
+        self._logs_cache: Dict[Tuple[str, int], str] = {}
+        # (time.monotonic() when gathered, stats)
+        self._stats_cache: Tuple[float, Dict] = (0.0, {})
+        self._stat_fd = _open_proc('/proc/stat')
+        self._meminfo_fd = _open_proc('/proc/meminfo')
+        atexit.register(self.close)
+    
+    def close(self) -> None:
+        """Release connections, worker threads and /proc file descriptors"""
+        self._close_smtp()
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for fd in (self._stat_fd, self._meminfo_fd):
+            if fd is not None:
+                os.close(fd)
+        self._stat_fd = self._meminfo_fd = None
+        atexit.unregister(self.close)
+    
+    def _get_unit(self, service_name: str):
+        """Return a cached systemd D-Bus unit proxy for the service"""
+        unit = self._units.get(service_name)
+        if unit is None:
+            unit_name = service_name if '.' in service_name else f"{service_name}.service"
+            unit = SystemdUnit(unit_name.encode(), _autoload=True)
+            self._units[service_name] = unit
+        return unit
     
     def check_service_status(self, service_name: str) -> Tuple[bool, str]:
-        """Check if service is running using systemctl"""
+        """Check if service is running via systemd D-Bus, or systemctl as fallback"""
+        if SystemdUnit is not None:
+            try:
+                status = self._get_unit(service_name).Unit.ActiveState.decode()
+                self.logger.debug(f"Service {service_name} status: {status}", self.correlation_id)
+                return status in ACTIVE_UNIT_STATES, status
+            except Exception as e:
+                self._units.pop(service_name, None)
+                self.logger.warning(f"D-Bus query for {service_name} failed, using systemctl: {str(e)}",
+                                    self.correlation_id)
+        
         try:
-            result = subprocess.run(
+            # Own session so a hung systemctl and anything it spawned can be killed together
+            with subprocess.Popen(
                 ['systemctl', 'is-active', service_name],
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                timeout=10
-            )
+                start_new_session=True
+            ) as proc:
+                try:
+                    output, _ = proc.communicate(timeout=10)
+                except subprocess.TimeoutExpired:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    proc.communicate()
+                    raise
             
-            is_active = result.returncode == 0
-            status = result.stdout.strip()
+            is_active = proc.returncode == 0
+            status = output.strip()
             
-            self.logger.log('DEBUG', f"Service {service_name} status: {status}", self.correlation_id)
+            self.logger.debug(f"Service {service_name} status: {status}", self.correlation_id)
             
             return is_active, status
         except subprocess.TimeoutExpired:
-            self.logger.log('ERROR', f"Timeout checking service {service_name}", self.correlation_id)
+            self.logger.error(f"Timeout checking service {service_name}", self.correlation_id)
             return False, "timeout"
         except Exception as e:
-            self.logger.log('ERROR', f"Error checking service {service_name}: {str(e)}", self.correlation_id)
+            self.logger.error(f"Error checking service {service_name}: {str(e)}", self.correlation_id)
             return False, f"error: {str(e)}"
     
-    def get_system_stats(self) -> Dict:
-        """Gather system resource statistics"""
+    def _read_cpu(self) -> float:
+        """Read CPU usage percentage from /proc/stat"""
+        if self._stat_fd is None:
+            raise OSError("/proc/stat unavailable")
+        # Aggregate line is first
+        cpu_stat = os.pread(self._stat_fd, 256, 0)
+        cpu_times = [int(field) for field in cpu_stat[:cpu_stat.find(b'\n')].split()[1:5]]
+        idle_time = cpu_times[3]
+        total_time = sum(cpu_times)
+        return round((1 - idle_time/total_time) * 100, 2)
+    
+    def _read_memory(self) -> float:
+        """Read memory usage percentage from /proc/meminfo"""
+        if self._meminfo_fd is None:
+            raise OSError("/proc/meminfo unavailable")
+        # MemTotal, MemFree and MemAvailable are the first three lines
+        meminfo = os.pread(self._meminfo_fd, 256, 0)
+        total = _meminfo_kb(meminfo, b'MemTotal:')
+        available = _meminfo_kb(meminfo, b'MemAvailable:')
+        if available is None:
+            available = _meminfo_kb(meminfo, b'MemFree:')
+        return round((1 - available/total) * 100, 2)
+    
+    def _read_disk(self) -> str:
+        """Read root filesystem usage, rounded up like df"""
+        st = os.statvfs('/')
+        used = st.f_blocks - st.f_bfree
+        total = used + st.f_bavail
+        if total == 0:
+            return 'N/A'
+        return f"{-(-used * 100 // total)}%"
+    
+    def get_system_stats(self, executor: Optional['Executor'] = None) -> Dict:
+        """Gather system resource statistics, concurrently if given an executor"""
+        now = time.monotonic()
+        cached_at, cached = self._stats_cache
+        if cached and now - cached_at < STATS_CACHE_TTL:
+            return dict(cached)
+        
+        readers = [
+            ('cpu_usage', 'CPU', self._read_cpu),
+            ('memory_usage', 'memory', self._read_memory),
+            ('disk_usage', 'disk', self._read_disk)
+        ]
+        if executor is not None:
+            readers = [(key, label, executor.submit(reader).result) for key, label, reader in readers]
+        
         stats = {}
+        for key, label, read in readers:
+            try:
+                stats[key] = read()
+            except Exception as e:
+                self.logger.warning(f"Failed to get {label} stats: {str(e)}", self.correlation_id)
+                stats[key] = 'N/A'
         
+        self._stats_cache = (now, stats)
+        return dict(stats)
+    
+    def get_recent_logs(self, service_name: str, lines: int = 50) -> str:
+        """Get recent logs from the service, fetched at most once per check"""
+        key = (service_name, lines)
+        logs = self._logs_cache.get(key)
+        if logs is None:
+            logs = self._logs_cache[key] = self._read_journal(service_name, lines)
+        return logs
+    
+    def _read_journal(self, service_name: str, lines: int) -> str:
+        """Read recent logs from journalctl, capped at MAX_LOG_BYTES"""
         try:
-            # CPU usage
-            with open('/proc/stat', 'r') as f:
-                cpu_line = f.readline()
-                cpu_times = list(map(int, cpu_line.split()[1:5]))
-                idle_time = cpu_times[3]
-                total_time = sum(cpu_times)
-                stats['cpu_usage'] = round((1 - idle_time/total_time) * 100, 2)
+            with subprocess.Popen(
+                ['journalctl', '-u', service_name, '-n', str(lines), '--no-pager'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            ) as proc:
+                timer = threading.Timer(10, proc.kill)
+                timer.start()
+                try:
+                    output = proc.stdout.read(MAX_LOG_BYTES)
+                    truncated = len(output) == MAX_LOG_BYTES
+                    if truncated:
+                        # SIGTERM may be blocked in children (they inherit the
+                        # main loop's signal mask), so stop the reader outright
+                        proc.stdout.close()
+                        proc.kill()
+                    returncode = proc.wait()
+                    errors = proc.stderr.read()
+                finally:
+                    timer.cancel()
+            
+            logs = output.decode('utf-8', errors='replace')
+            if truncated:
+                return logs + "\n[log output truncated]\n"
+            if returncode == 0:
+                return logs
+            if returncode == -signal.SIGKILL:
+                return "Error retrieving logs: timed out"
+            return f"Failed to retrieve logs: {errors.decode('utf-8', errors='replace')}"
         except Exception as e:
-            self.logger.log('WARNING', f"Failed to get CPU stats: {str(e)}", self.correlation_id)
-            stats['cpu_usage'] = 'N/A'
-        
+            return f"Error retrieving logs: {str(e)}"
+    
+    def _resolve(self, host: str) -> str:
+        """Resolve host to an IPv4 address, caching it for the record TTL"""
+        # Querying DNS directly bypasses /etc/hosts and nsswitch, so it is opt-in
+        if not self.config.smtp.dns_cache:
+            return host
         try:
-            # Memory usage
-            with open('/proc/meminfo', 'r') as f:
-                meminfo = dict((line.split()[0].rstrip(':'), int(line.split()[1])) 
-                              for line in f.readlines())
-                total = meminfo['MemTotal']
-                available = meminfo.get('MemAvailable', meminfo['MemFree'])
-                stats['memory_usage'] = round((1 - available/total) * 100, 2)
-        except Exception as e:
-            self.logger.log('WARNING', f"Failed to get memory stats: {str(e)}", self.correlation_id)
-            stats['memory_usage'] = 'N/A'
+            import dns.resolver
+        except ImportError:  # Fall back to the system resolver on every connect
+            return host
+        import ipaddress
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        
+        now = time.monotonic()
+        cached = self._dns_cache.get(host)
+        if cached and cached[0] > now:
+            return cached[1]
         
         try:
-            # Disk usage
-            result = subprocess.run(['df', '-h', '/'], capture_output=True, text=True)
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                if len(lines) > 1:
-                    parts = lines[1].split()
-                    stats['disk_usage'] = parts[4] if len(parts) > 4 else 'N/A'
-            else:
-                stats['disk_usage'] = 'N/A'
+            answer = dns.resolver.resolve(host, 'A')
         except Exception as e:
-            self.logger.log('WARNING', f"Failed to get disk stats: {str(e)}", self.correlation_id)
-            stats['disk_usage'] = 'N/A'
+            self.logger.debug(f"DNS lookup for {host} failed, using system resolver: {str(e)}",
+                              self.correlation_id)
+            return host
         
-        return stats
+        address = answer[0].to_text()
+        self._dns_cache[host] = (now + answer.rrset.ttl, address)
+        return address
     
-    def get_recent_logs(self, service_name: str, lines: int = 50) -> str:
-        """Get recent logs from the service"""
+    def _get_smtp(self) -> 'smtplib.SMTP':
+        """Return the cached SMTP connection, reconnecting if it is stale"""
+        import smtplib
+        
+        if self._smtp is not None:
+            if self._smtp_sent < SMTP_MAX_MESSAGES_PER_CONNECTION:
+                try:
+                    if self._smtp.noop()[0] == 250:
+                        return self._smtp
+                except Exception:
+                    pass
+            self._close_smtp(graceful=False)
+        
+        smtp = self.config.smtp
+        smtp_class = _pipelined_smtp_class() if smtp.pipelining else smtplib.SMTP
+        server = smtp_class(timeout=smtp.timeout)
+        # Keep the server name for STARTTLS certificate checks
+        server._host = smtp.server
         try:
-            result = subprocess.run(
-                ['journalctl', '-u', service_name, '-n', str(lines), '--no-pager'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
+            server.connect(self._resolve(smtp.server), smtp.port)
+            if smtp.use_tls:
+                server.starttls()
             
-            if result.returncode == 0:
-                return result.stdout
+            if smtp.username and smtp.password:
+                server.login(smtp.username, smtp.password)
+        except Exception:
+            server.close()
+            raise
+        
+        self._smtp = server
+        self._smtp_sent = 0
+        return server
+    
+    def _close_smtp(self, graceful: bool = True) -> None:
+        """Close the cached SMTP connection"""
+        if self._smtp is None:
+            return
+        
+        server, self._smtp = self._smtp, None
+        try:
+            if graceful:
+                server.quit()
             else:
-                return f"Failed to retrieve logs: {result.stderr}"
-        except Exception as e:
-            return f"Error retrieving logs: {str(e)}"
+                server.close()
+        except Exception:
+            server.close()
     
     def send_email_alert(self, subject: str, body_text: str, body_html: str) -> bool:
         """Send email alert with retry logic"""
-        if self.config['features']['dry_run']:
-            self.logger.log('INFO', f"DRY RUN: Would send email - {subject}", self.correlation_id)
+        if self.config.features.dry_run:
+            self.logger.info(f"DRY RUN: Would send email - {subject}", self.correlation_id)
             return True
         
-        smtp_config = self.config['smtp']
-        attempts = self.config['monitoring']['retry_attempts']
-        delay = self.config['monitoring']['retry_delay']
+        if self._smtp_consecutive_failures >= SMTP_CIRCUIT_THRESHOLD:
+            elapsed = time.monotonic() - self._smtp_circuit_opened
+            if elapsed < self.config.monitoring.alert_cooldown:
+                self.logger.warning(f"smtp-circuit-open: skipping email - {subject}", self.correlation_id)
+                return False
+            # Half-open: one more failed alert reopens the circuit
+            self._smtp_consecutive_failures = SMTP_CIRCUIT_THRESHOLD - 1
+        
+        import random
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
+        smtp = self.config.smtp
+        attempts = self.config.monitoring.retry_attempts
+        delay = self.config.monitoring.retry_delay
+        # Give up retrying rather than run into the next check
+        deadline = time.monotonic() + self.config.monitoring.check_interval
+        
+        # Built once and reused across retries
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = smtp.from_address
+        msg['To'] = ', '.join(smtp.to_addresses)
+        
+        msg.attach(MIMEText(body_text, 'plain'))
+        msg.attach(MIMEText(body_html, 'html'))
         
         for attempt in range(attempts):
             try:
-                msg = MIMEMultipart('alternative')
-                msg['Subject'] = subject
-                msg['From'] = smtp_config['from_address']
-                msg['To'] = ', '.join(smtp_config['to_addresses'])
-                
-                msg.attach(MIMEText(body_text, 'plain'))
-                msg.attach(MIMEText(body_html, 'html'))
+                server = self._get_smtp()
+                # All recipients go in one envelope
+                server.send_message(msg, to_addrs=smtp.to_addresses)
+                self._smtp_sent += 1
                 
-                with smtplib.SMTP(smtp_config['server'], smtp_config['port'], 
-                                 timeout=smtp_config['timeout']) as server:
-                    if smtp_config['use_tls']:
-                        server.starttls()
-                    
-                    if smtp_config['username'] and smtp_config['password']:
-                        server.login(smtp_config['username'], smtp_config['password'])
-                    
-                    server.send_message(msg)
-                
-                self.logger.log('INFO', f"Email sent successfully: {subject}", self.correlation_id)
+                self._smtp_consecutive_failures = 0
+                self.logger.info(f"Email sent successfully: {subject}", self.correlation_id)
                 return True
                 
             except Exception as e:
-                self.logger.log('ERROR', f"Email send attempt {attempt + 1} failed: {str(e)}", 
-                              self.correlation_id)
+                self.logger.error(f"Email send attempt {attempt + 1} failed: {str(e)}", 
+                                  self.correlation_id)
+                # Server replies leave the session usable; anything else
+                # (socket errors, disconnects) forces a fresh connection
+                if not isinstance(e, smtplib.SMTPException) or isinstance(e, smtplib.SMTPServerDisconnected):
+                    self._close_smtp(graceful=False)
                 if attempt < attempts - 1:
-                    time.sleep(delay * (2 ** attempt))  # Exponential backoff
+                    # Capped exponential backoff with jitter
+                    backoff = min(SMTP_MAX_BACKOFF, delay * (2 ** attempt)) + random.uniform(0, 0.5)
+                    if time.monotonic() + backoff > deadline:
+                        self.logger.error("Email retry budget exhausted", self.correlation_id)
+                        break
+                    time.sleep(backoff)
         
+        self._smtp_consecutive_failures += 1
+        if self._smtp_consecutive_failures >= SMTP_CIRCUIT_THRESHOLD:
+            self._smtp_circuit_opened = time.monotonic()
+            self.logger.error("smtp-circuit-open: suspending email alerts for the alert cooldown",
+                              self.correlation_id)
         return False
     
+    def _get_executor(self) -> 'Executor':
+        """Return the worker pool used to gather alert context, kept across alerts"""
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='alert-context')
+        return self._executor
+    
     def create_alert_content(self, service_name: str, status: str, 
                            is_recovery: bool = False) -> Tuple[str, str, str]:
         """Create email alert content"""
-        hostname = socket.gethostname()
+        hostname = HOSTNAME
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         if is_recovery:
@@ -354,85 +1035,37 @@ class ServiceMonitor:
             alert_type = "FAILURE"
             alert_color = "#dc3545"
         
-        # Get additional context
-        stats = self.get_system_stats()
-        logs = self.get_recent_logs(service_name)
-        
-        # Plain text version
-        text_body = f"""
-{alert_type} ALERT: {service_name} Service Monitoring
-
-Timestamp: {timestamp}
-Hostname: {hostname}
-Service: {service_name}
-Status: {status}
-
-System Statistics:
-- CPU Usage: {stats.get('cpu_usage', 'N/A')}%
-- Memory Usage: {stats.get('memory_usage', 'N/A')}%
-- Disk Usage: {stats.get('disk_usage', 'N/A')}
-
-Recent Service Logs:
-{logs}
-
----
-This is an automated alert from Squid Monitor v{__version__}
-        """
-        
-        # HTML version
-        html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; color: #333; }}
-        .header {{ background-color: {alert_color}; color: white; padding: 20px; }}
-        .content {{ padding: 20px; }}
-        .stats {{ background-color: #f8f9fa; padding: 15px; margin: 10px 0; }}
-        .logs {{ background-color: #f1f1f1; padding: 15px; margin: 10px 0; 
-                font-family: monospace; font-size: 12px; overflow-x: auto; }}
-        .footer {{ color: #666; font-size: 12px; padding: 10px; }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h2>{alert_type} ALERT: {service_name} Service</h2>
-    </div>
-    <div class="content">
-        <p><strong>Timestamp:</strong> {timestamp}</p>
-        <p><strong>Hostname:</strong> {hostname}</p>
-        <p><strong>Service:</strong> {service_name}</p>
-        <p><strong>Status:</strong> <code>{status}</code></p>
+        # Get additional context; logs and each statistic are fetched concurrently
+        executor = self._get_executor()
+        logs_future = executor.submit(self.get_recent_logs, service_name)
+        stats = self.get_system_stats(executor)
+        logs = logs_future.result()
         
-        <div class="stats">
-            <h3>System Statistics</h3>
-            <ul>
-                <li>CPU Usage: {stats.get('cpu_usage', 'N/A')}%</li>
-                <li>Memory Usage: {stats.get('memory_usage', 'N/A')}%</li>
-                <li>Disk Usage: {stats.get('disk_usage', 'N/A')}</li>
-            </ul>
-        </div>
-        
-        <div class="logs">
-            <h3>Recent Service Logs</h3>
-            <pre>{logs}</pre>
-        </div>
-    </div>
-    <div class="footer">
-        <p>This is an automated alert from Squid Monitor v{__version__}</p>
-    </div>
-</body>
-</html>
-        """
+        values = {
+            'alert_type': alert_type,
+            'alert_color': alert_color,
+            'service_name': service_name,
+            'status': status,
+            'timestamp': timestamp,
+            'hostname': hostname,
+            'cpu_usage': stats.get('cpu_usage', 'N/A'),
+            'memory_usage': stats.get('memory_usage', 'N/A'),
+            'disk_usage': stats.get('disk_usage', 'N/A'),
+            'logs': logs,
+            'version': __version__
+        }
+        text_body = TEXT_ALERT_TEMPLATE.format_map(values)
+        html_body = HTML_ALERT_TEMPLATE.format_map(values)
         
         return subject, text_body, html_body
     
     def run_check(self) -> None:
         """Run a single monitoring check"""
-        service_name = self.config['monitoring']['service_name']
-        self.correlation_id = str(uuid.uuid4())
+        service_name = self.config.monitoring.service_name
+        self.correlation_id = new_correlation_id()
+        self._logs_cache.clear()
         
-        self.logger.log('DEBUG', f"Starting service check for {service_name}", self.correlation_id)
+        self.logger.debug(f"Starting service check for {service_name}", self.correlation_id)
         
         # Check service status
         is_active, status = self.check_service_status(service_name)
@@ -440,7 +1073,7 @@ This is an automated alert from Squid Monitor v{__version__}
         # Determine if alert should be sent
         should_alert = self.state_manager.should_send_alert(
             is_active, 
-            self.config['monitoring']['alert_cooldown']
+            self.config.monitoring.alert_cooldown
         )
         
         if should_alert:
@@ -453,11 +1086,11 @@ This is an automated alert from Squid Monitor v{__version__}
             email_sent = self.send_email_alert(subject, text_body, html_body)
             
             if not email_sent:
-                self.logger.log('ERROR', "Failed to send email alert after all retries", 
-                              self.correlation_id)
+                self.logger.error("Failed to send email alert after all retries", 
+                                  self.correlation_id)
             
             # Send webhook if enabled
-            if self.config['features']['enable_webhooks'] and self.config['features']['webhook_url']:
+            if self.config.features.enable_webhooks and self.config.features.webhook_url:
                 self.send_webhook_alert(service_name, is_active, status)
             
             # Update state
@@ -466,44 +1099,80 @@ This is an automated alert from Squid Monitor v{__version__}
             # Just update state
             self.state_manager.update_state(is_active, alert_sent=False)
         
-        self.logger.log('INFO', 
+        self.state_manager.flush()
+        
+        self.logger.info(
                        f"Check complete - Service: {service_name}, Status: {status}, Alert sent: {should_alert}", 
                        self.correlation_id)
     
+    def _get_http(self):
+        """Return the shared HTTP session used for webhook delivery"""
+        if self._http is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._http = session
+        return self._http
+    
     def send_webhook_alert(self, service_name: str, is_active: bool, status: str) -> None:
         """Send webhook notification"""
-        if self.config['features']['dry_run']:
-            self.logger.log('INFO', "DRY RUN: Would send webhook", self.correlation_id)
+        if self.config.features.dry_run:
+            self.logger.info("DRY RUN: Would send webhook", self.correlation_id)
             return
         
         try:
-            import requests
-            
             payload = {
                 'service': service_name,
-                'hostname': socket.gethostname(),
+                'hostname': HOSTNAME,
                 'status': status,
                 'is_active': is_active,
                 'timestamp': datetime.now().isoformat(),
                 'correlation_id': self.correlation_id
             }
             
-            response = requests.post(
-                self.config['features']['webhook_url'],
+            response = self._get_http().post(
+                self.config.features.webhook_url,
                 json=payload,
                 timeout=30
             )
             
             if response.status_code == 200:
-                self.logger.log('INFO', "Webhook sent successfully", self.correlation_id)
+                self.logger.info("Webhook sent successfully", self.correlation_id)
             else:
-                self.logger.log('ERROR', f"Webhook failed: {response.status_code}", self.correlation_id)
+                self.logger.error(f"Webhook failed: {response.status_code}", self.correlation_id)
                 
         except Exception as e:
-            self.logger.log('ERROR', f"Webhook error: {str(e)}", self.correlation_id)
+            self.logger.error(f"Webhook error: {str(e)}", self.correlation_id)
+
+def build_monitor(args: 'argparse.Namespace') -> 'ServiceMonitor':
+    """Load configuration and initialize monitor components"""
+    config = Config(args.config)
+    
+    # Override with command line arguments
+    if args.dry_run:
+        config.features = replace(config.features, dry_run=True)
+    if args.debug:
+        config.monitoring = replace(config.monitoring, log_level='DEBUG')
+    
+    logger = Logger(config)
+    state_manager = StateManager(config.monitoring.state_file)
+    return ServiceMonitor(config, logger, state_manager)
+
+def reload_monitor(monitor: 'ServiceMonitor', args: 'argparse.Namespace') -> 'ServiceMonitor':
+    """Rebuild the monitor from fresh configuration and release the old one"""
+    new_monitor = build_monitor(args)
+    monitor.close()
+    monitor.state_manager.close()
+    return new_monitor
 
 def main():
     """Main entry point"""
+    import argparse
+    
     parser = argparse.ArgumentParser(
         description='Squid Service Monitor - Monitor and alert on service status',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -513,6 +1182,7 @@ Examples:
   %(prog)s -c config.yaml     # Use custom config file
   %(prog)s --dry-run          # Test mode without sending alerts
   %(prog)s --once             # Run single check and exit
+  %(prog)s --dump-state       # Show saved monitoring state
   %(prog)s --version          # Show version information
         """
     )
@@ -521,43 +1191,53 @@ Examples:
     parser.add_argument('--dry-run', action='store_true', help='Test mode - no alerts sent')
     parser.add_argument('--once', action='store_true', help='Run once and exit')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+    parser.add_argument('--dump-state', action='store_true', help='Print saved state as JSON and exit')
     parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
     
     args = parser.parse_args()
     
     try:
-        # Load configuration
-        config = Config(args.config)
-        
-        # Override with command line arguments
-        if args.dry_run:
-            config.config['features']['dry_run'] = True
-        if args.debug:
-            config.config['monitoring']['log_level'] = 'DEBUG'
+        if args.dump_state:
+            config = Config(args.config)
+            print(StateManager(config.monitoring.state_file, read_only=True).export_json())
+            return
         
-        # Initialize components
-        logger = Logger(config.config)
-        state_manager = StateManager(config.config['monitoring']['state_file'])
-        monitor = ServiceMonitor(config, logger, state_manager)
+        monitor = build_monitor(args)
+        logger = monitor.logger
         
         # Log startup
-        logger.log('INFO', f"Squid Monitor v{__version__} starting", str(uuid.uuid4()))
+        logger.info(f"Squid Monitor v{__version__} starting", new_correlation_id())
         
         # Run monitoring
         if args.once:
             monitor.run_check()
         else:
-            # Continuous monitoring loop
+            # Continuous monitoring loop; signals are only delivered while waiting
+            signal.pthread_sigmask(signal.SIG_BLOCK, LOOP_SIGNALS)
             while True:
                 try:
                     monitor.run_check()
-                    time.sleep(config.config['monitoring']['check_interval'])
-                except KeyboardInterrupt:
-                    logger.log('INFO', "Monitor stopped by user", str(uuid.uuid4()))
-                    break
+                    delay = monitor.config.monitoring.check_interval
                 except Exception as e:
-                    logger.log('ERROR', f"Unexpected error in main loop: {str(e)}", str(uuid.uuid4()))
-                    time.sleep(60)  # Wait before retrying
+                    logger.error(f"Unexpected error in main loop: {str(e)}", new_correlation_id())
+                    delay = 60  # Wait before retrying
+                
+                sig = signal.sigtimedwait(LOOP_SIGNALS, delay)
+                if sig is None:
+                    continue
+                
+                if sig.si_signo == signal.SIGHUP:
+                    try:
+                        monitor = reload_monitor(monitor, args)
+                    except Exception as e:
+                        logger.error(f"Configuration reload failed: {str(e)}", new_correlation_id())
+                        continue
+                    logger = monitor.logger
+                    logger.info("Configuration reloaded", new_correlation_id())
+                else:
+                    logger.info(f"Monitor stopped by {signal.Signals(sig.si_signo).name}",
+                                new_correlation_id())
+                    break
         
     except Exception as e:
         print(f"Fatal error: {str(e)}", file=sys.stderr)
@@ -3,7 +3,7 @@
 
 # Set environment variables to use local paths
 export LOG_FILE="./logs/monitor.log"
-export STATE_FILE="./state/state.json"
+export STATE_FILE="./state/state.bin"
 export DRY_RUN=true
 export LOG_LEVEL=INFO
 
@@ -4,8 +4,12 @@
 import unittest
 import tempfile
 import json
+import logging
 import os
-from datetime import datetime, timedelta
+import subprocess
+import time
+from dataclasses import replace
+from datetime import datetime
 from unittest.mock import Mock, patch, MagicMock
 import sys
 import yaml
@@ -13,22 +17,36 @@ import yaml
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from squid_monitor import Config, StateManager, ServiceMonitor, Logger
+# State files are rewritten on every update; keep them on tmpfs when possible
+STATE_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+from squid_monitor import Config, StateManager, ServiceMonitor, Logger, PipelinedSMTP, JsonFormatter
 
 
 class TestConfig(unittest.TestCase):
     """Test configuration management"""
     
     def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
         
     def test_default_config(self):
         """Test loading default configuration"""
         config = Config()
         
-        self.assertEqual(config.config['smtp']['server'], 'smtp.example.com')
-        self.assertEqual(config.config['smtp']['port'], 25)
-        self.assertEqual(config.config['monitoring']['service_name'], 'squid')
+        self.assertEqual(config.smtp.server, 'smtp.example.com')
+        self.assertEqual(config.smtp.port, 25)
+        self.assertEqual(config.monitoring.service_name, 'squid')
+        
+    def test_defaults_not_mutated(self):
+        """Test overrides do not leak into the shared defaults"""
+        from squid_monitor import DEFAULT_CONFIG
+        with patch.dict(os.environ, {'SMTP_SERVER': 'env.smtp.com'}):
+            Config()
+        
+        self.assertEqual(DEFAULT_CONFIG['smtp']['server'], 'smtp.example.com')
+        self.assertEqual(Config().smtp.server, 'smtp.example.com')
         
     def test_config_from_file(self):
         """Test loading configuration from YAML file"""
@@ -44,8 +62,39 @@ class TestConfig(unittest.TestCase):
             yaml.dump(test_config, f)
         
         config = Config(config_file)
-        self.assertEqual(config.config['smtp']['server'], 'test.smtp.com')
-        self.assertEqual(config.config['smtp']['port'], 587)
+        self.assertEqual(config.smtp.server, 'test.smtp.com')
+        self.assertEqual(config.smtp.port, 587)
+        
+    def test_config_file_parse_cached(self):
+        """Test an unchanged config file is parsed once"""
+        config_file = os.path.join(self.temp_dir, 'cached_config.yaml')
+        with open(config_file, 'w') as f:
+            yaml.dump({'smtp': {'server': 'first.smtp.com'}}, f)
+        
+        with patch('yaml.load', wraps=yaml.load) as mock_load:
+            Config(config_file)
+            config = Config(config_file)
+            self.assertEqual(mock_load.call_count, 1)
+            self.assertEqual(config.smtp.server, 'first.smtp.com')
+            
+            with open(config_file, 'w') as f:
+                yaml.dump({'smtp': {'server': 'second.smtp.com'}}, f)
+            config = Config(config_file)
+            self.assertEqual(mock_load.call_count, 2)
+            self.assertEqual(config.smtp.server, 'second.smtp.com')
+        
+    def test_config_sections_frozen(self):
+        """Test config sections are immutable and ignore unknown keys"""
+        from dataclasses import FrozenInstanceError
+        config_file = os.path.join(self.temp_dir, 'extra_config.yaml')
+        with open(config_file, 'w') as f:
+            yaml.dump({'smtp': {'unknown_option': 1}, 'plugins': {'enabled': []}}, f)
+        
+        config = Config(config_file)
+        
+        self.assertIsInstance(config.smtp.to_addresses, tuple)
+        with self.assertRaises(FrozenInstanceError):
+            config.smtp.server = 'other.example.com'
         
     def test_env_override(self):
         """Test environment variable override"""
@@ -53,13 +102,23 @@ class TestConfig(unittest.TestCase):
         os.environ['SMTP_PORT'] = '2525'
         
         config = Config()
-        self.assertEqual(config.config['smtp']['server'], 'env.smtp.com')
-        self.assertEqual(config.config['smtp']['port'], 2525)
+        self.assertEqual(config.smtp.server, 'env.smtp.com')
+        self.assertEqual(config.smtp.port, 2525)
         
         # Cleanup
         del os.environ['SMTP_SERVER']
         del os.environ['SMTP_PORT']
         
+    def test_env_override_types(self):
+        """Test environment overrides are parsed to the field types"""
+        env = {'DRY_RUN': 'TRUE', 'ENABLE_SYSLOG': 'false', 'CHECK_INTERVAL': '60'}
+        with patch.dict(os.environ, env):
+            config = Config()
+        
+        self.assertIs(config.features.dry_run, True)
+        self.assertIs(config.features.enable_syslog, False)
+        self.assertEqual(config.monitoring.check_interval, 60)
+        
     def test_email_validation(self):
         """Test email address validation"""
         os.environ['SMTP_FROM'] = 'invalid-email'
@@ -70,26 +129,88 @@ class TestConfig(unittest.TestCase):
         # Cleanup
         del os.environ['SMTP_FROM']
         
+    def test_email_shape(self):
+        """Test the address scanner accepts and rejects the expected shapes"""
+        from squid_monitor import _is_email
+        
+        for address in ['ops@example.com', 'first.last+tag@mail.example.co.uk']:
+            self.assertTrue(_is_email(address), address)
+        for address in ['invalid-email', '@example.com', 'ops@.com', 'ops@example.c',
+                        'ops@example.c0m', 'ops team@example.com', 'ops@ex@ample.com']:
+            self.assertFalse(_is_email(address), address)
+        
     def test_multiple_recipients(self):
         """Test parsing multiple email recipients"""
         os.environ['SMTP_TO'] = 'user1@example.com,user2@example.com'
         
         config = Config()
-        self.assertEqual(len(config.config['smtp']['to_addresses']), 2)
-        self.assertIn('user1@example.com', config.config['smtp']['to_addresses'])
-        self.assertIn('user2@example.com', config.config['smtp']['to_addresses'])
+        self.assertEqual(len(config.smtp.to_addresses), 2)
+        self.assertIn('user1@example.com', config.smtp.to_addresses)
+        self.assertIn('user2@example.com', config.smtp.to_addresses)
         
         # Cleanup
         del os.environ['SMTP_TO']
+        
+    def test_recipients_whitespace(self):
+        """Test recipient lists tolerate spaces and trailing commas"""
+        with patch.dict(os.environ, {'SMTP_TO': ' user1@example.com , user2@example.com,'}):
+            config = Config()
+        
+        self.assertEqual(config.smtp.to_addresses, ('user1@example.com', 'user2@example.com'))
+        
+    def test_recipients_required(self):
+        """Test an empty recipient list is rejected"""
+        for value in ('', ','):
+            with patch.dict(os.environ, {'SMTP_TO': value}):
+                with self.assertRaises(ValueError):
+                    Config()
+
+
+class TestJsonFormatter(unittest.TestCase):
+    """Test structured log formatting"""
+    
+    def test_message_escaped(self):
+        """Test quotes and newlines in messages still produce valid JSON"""
+        record = logging.LogRecord('squid-monitor', logging.ERROR, __file__, 1,
+                                   'Failed: "boom"\nTraceback', None, None)
+        record.correlation_id = 'abc123'
+        record.hostname = 'server01'
+        
+        entry = json.loads(JsonFormatter().format(record))
+        
+        self.assertEqual(entry['message'], 'Failed: "boom"\nTraceback')
+        self.assertEqual(entry['level'], 'ERROR')
+        self.assertEqual(entry['correlation_id'], 'abc123')
+        self.assertEqual(entry['hostname'], 'server01')
+        self.assertEqual(entry['timestamp'], logging.Formatter().formatTime(record))
+        
+    def test_timestamp_cached_per_second(self):
+        """Test the formatted time is reused within a second but keeps milliseconds"""
+        formatter = JsonFormatter()
+        first = logging.LogRecord('squid-monitor', logging.INFO, __file__, 1, 'a', None, None)
+        second = logging.LogRecord('squid-monitor', logging.INFO, __file__, 1, 'b', None, None)
+        first.created, first.msecs = 1700000000.125, 125.0
+        second.created, second.msecs = 1700000000.750, 750.0
+        
+        with patch('time.strftime', wraps=time.strftime) as mock_strftime:
+            first_time = formatter.formatTime(first)
+            second_time = formatter.formatTime(second)
+        
+        mock_strftime.assert_called_once()
+        self.assertEqual(first_time, logging.Formatter().formatTime(first))
+        self.assertEqual(second_time, logging.Formatter().formatTime(second))
 
 
 class TestStateManager(unittest.TestCase):
     """Test state management"""
     
     def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.state_file = os.path.join(self.temp_dir, 'test_state.json')
+        temp_dir = tempfile.TemporaryDirectory(dir=STATE_DIR)
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.state_file = os.path.join(self.temp_dir, 'test_state.bin')
         self.state_manager = StateManager(self.state_file)
+        self.addCleanup(self.state_manager.close)
         
     def test_initial_state(self):
         """Test initial state creation"""
@@ -99,7 +220,7 @@ class TestStateManager(unittest.TestCase):
         
     def test_state_persistence(self):
         """Test state save and load"""
-        self.state_manager.state['last_check'] = datetime.now().isoformat()
+        self.state_manager.state['last_check'] = time.time()
         self.state_manager.state['last_status'] = True
         self.state_manager.save_state()
         
@@ -108,6 +229,85 @@ class TestStateManager(unittest.TestCase):
         self.assertTrue(new_manager.state['last_status'])
         self.assertIsNotNone(new_manager.state['last_check'])
         
+    def test_state_file_is_fixed_size(self):
+        """Test state is stored as a single fixed-size record"""
+        self.state_manager.update_state(False, alert_sent=True)
+        self.state_manager.update_state(False, alert_sent=False)
+        self.state_manager.flush()
+        
+        self.assertEqual(os.path.getsize(self.state_file), 33)
+        new_manager = StateManager(self.state_file)
+        self.assertEqual(new_manager.state, self.state_manager.state)
+        
+    def test_update_state_deferred_until_flush(self):
+        """Test state updates are written once on flush"""
+        with patch('os.pwrite', wraps=os.pwrite) as mock_pwrite:
+            self.state_manager.update_state(False, alert_sent=True)
+            self.state_manager.update_state(False)
+            mock_pwrite.assert_not_called()
+            
+            self.state_manager.flush()
+            self.state_manager.flush()
+            mock_pwrite.assert_called_once()
+        
+        self.assertEqual(StateManager(self.state_file).state['consecutive_failures'], 2)
+        
+    def test_legacy_json_state(self):
+        """Test state written by JSON-based versions is migrated"""
+        legacy_file = os.path.join(self.temp_dir, 'legacy_state.json')
+        legacy_state = {
+            'last_check': datetime.now().isoformat(),
+            'last_status': False,
+            'last_alert_time': datetime.now().isoformat(),
+            'consecutive_failures': 4,
+            'last_success_time': None
+        }
+        with open(legacy_file, 'w') as f:
+            json.dump(legacy_state, f, indent=2)
+        
+        manager = StateManager(legacy_file)
+        self.assertAlmostEqual(manager.state['last_check'],
+                               datetime.fromisoformat(legacy_state['last_check']).timestamp())
+        self.assertFalse(manager.state['last_status'])
+        self.assertEqual(manager.state['consecutive_failures'], 4)
+        self.assertIsNone(manager.state['last_success_time'])
+        self.assertEqual(json.loads(manager.export_json()), legacy_state)
+        
+        manager.save_state()
+        self.assertEqual(json.loads(StateManager(legacy_file).export_json()), legacy_state)
+        
+    def test_legacy_json_state_beside_binary(self):
+        """Test state.json is read when the renamed state.bin does not exist yet"""
+        with open(os.path.join(self.temp_dir, 'state.json'), 'w') as f:
+            json.dump({'last_status': False, 'consecutive_failures': 2,
+                       'last_alert_time': datetime.now().isoformat()}, f)
+        
+        state_file = os.path.join(self.temp_dir, 'state.bin')
+        manager = StateManager(state_file)
+        
+        self.assertFalse(manager.state['last_status'])
+        self.assertEqual(manager.state['consecutive_failures'], 2)
+        self.assertIsNone(manager.state['last_check'])
+        self.assertFalse(manager.should_send_alert(False, 3600))
+        
+        # Fields the old file lacked still save and export
+        manager.update_state(False)
+        manager.flush()
+        manager.close()
+        exported = json.loads(StateManager(state_file).export_json())
+        self.assertEqual(exported['consecutive_failures'], 3)
+        self.assertIsNone(exported['last_success_time'])
+        
+    def test_read_only_does_not_create(self):
+        """Test read-only access leaves a missing state file missing"""
+        missing = os.path.join(self.temp_dir, 'new', 'state.bin')
+        
+        manager = StateManager(missing, read_only=True)
+        manager.close()
+        
+        self.assertIsNone(manager.state['last_status'])
+        self.assertFalse(os.path.exists(os.path.dirname(missing)))
+        
     def test_should_send_alert_first_failure(self):
         """Test alert on first failure"""
         self.assertTrue(self.state_manager.should_send_alert(False, 3600))
@@ -121,16 +321,33 @@ class TestStateManager(unittest.TestCase):
         """Test alert cooldown period"""
         # Set last alert time
         self.state_manager.state['last_status'] = False
-        self.state_manager.state['last_alert_time'] = datetime.now().isoformat()
+        self.state_manager.state['last_alert_time'] = time.time()
         
         # Should not alert immediately
         self.assertFalse(self.state_manager.should_send_alert(False, 3600))
         
         # Should alert after cooldown
-        old_time = datetime.now() - timedelta(seconds=3700)
-        self.state_manager.state['last_alert_time'] = old_time.isoformat()
+        self.state_manager.state['last_alert_time'] = time.time() - 3700
         self.assertTrue(self.state_manager.should_send_alert(False, 3600))
         
+    def test_failed_alert_not_repeated(self):
+        """Test an outage whose email failed does not re-alert on every check"""
+        config = Config()
+        config.features = replace(config.features, enable_webhooks=True,
+                                  webhook_url='https://hooks.example.com/alert')
+        monitor = ServiceMonitor(config, Mock(), self.state_manager)
+        self.addCleanup(monitor.close)
+        
+        with patch.object(monitor, 'check_service_status', return_value=(False, 'inactive')), \
+             patch.object(monitor, 'create_alert_content', return_value=('s', 't', 'h')), \
+             patch.object(monitor, 'send_email_alert', return_value=False), \
+             patch.object(monitor, 'send_webhook_alert') as mock_webhook:
+            for _ in range(5):
+                monitor.run_check()
+        
+        mock_webhook.assert_called_once()
+        self.assertIsNone(self.state_manager.state['last_alert_time'])
+        
     def test_update_state(self):
         """Test state updates"""
         # Test failure
@@ -154,94 +371,232 @@ class TestServiceMonitor(unittest.TestCase):
         self.logger = Mock()
         self.state_manager = Mock()
         self.monitor = ServiceMonitor(self.config, self.logger, self.state_manager)
+        self.addCleanup(self.monitor.close)
+        
+        # Exercise the systemctl path unless a test opts in
+        patcher = patch('squid_monitor.SystemdUnit', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         
-    @patch('subprocess.run')
-    def test_check_service_status_active(self, mock_run):
+    @patch('subprocess.Popen')
+    def test_check_service_status_active(self, mock_popen):
         """Test checking active service"""
-        mock_run.return_value = Mock(returncode=0, stdout='active')
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.communicate.return_value = ('active\n', '')
+        proc.returncode = 0
         
         is_active, status = self.monitor.check_service_status('squid')
         
         self.assertTrue(is_active)
         self.assertEqual(status, 'active')
-        mock_run.assert_called_once()
+        mock_popen.assert_called_once()
+        self.assertTrue(mock_popen.call_args.kwargs['start_new_session'])
         
-    @patch('subprocess.run')
-    def test_check_service_status_inactive(self, mock_run):
+    @patch('subprocess.Popen')
+    def test_check_service_status_inactive(self, mock_popen):
         """Test checking inactive service"""
-        mock_run.return_value = Mock(returncode=3, stdout='inactive')
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.communicate.return_value = ('inactive\n', '')
+        proc.returncode = 3
         
         is_active, status = self.monitor.check_service_status('squid')
         
         self.assertFalse(is_active)
         self.assertEqual(status, 'inactive')
         
-    @patch('subprocess.run')
-    def test_check_service_timeout(self, mock_run):
-        """Test service check timeout"""
-        import subprocess
-        mock_run.side_effect = subprocess.TimeoutExpired('systemctl', 10)
+    def test_check_service_status_dbus(self):
+        """Test checking service state over D-Bus"""
+        with patch('squid_monitor.SystemdUnit') as mock_unit, patch('subprocess.Popen') as mock_popen:
+            mock_unit.return_value.Unit.ActiveState = b'active'
+            
+            is_active, status = self.monitor.check_service_status('squid')
+            self.monitor.check_service_status('squid')
+            
+            self.assertTrue(is_active)
+            self.assertEqual(status, 'active')
+            mock_unit.assert_called_once_with(b'squid.service', _autoload=True)
+            mock_popen.assert_not_called()
+        
+    def test_check_service_status_dbus_reloading(self):
+        """Test a reloading unit counts as up, as with systemctl is-active"""
+        with patch('squid_monitor.SystemdUnit') as mock_unit:
+            mock_unit.return_value.Unit.ActiveState = b'reloading'
+            
+            is_active, status = self.monitor.check_service_status('squid')
+        
+        self.assertTrue(is_active)
+        self.assertEqual(status, 'reloading')
+        
+    def test_check_service_status_dbus_fallback(self):
+        """Test a failed D-Bus query falls back to systemctl"""
+        with patch('squid_monitor.SystemdUnit') as mock_unit, patch('subprocess.Popen') as mock_popen:
+            mock_unit.side_effect = RuntimeError('bus unavailable')
+            mock_unit.return_value.Unit.ActiveState = b'active'
+            proc = mock_popen.return_value.__enter__.return_value
+            proc.communicate.return_value = ('inactive\n', '')
+            proc.returncode = 3
+            
+            is_active, status = self.monitor.check_service_status('squid')
+            
+            self.assertFalse(is_active)
+            self.assertEqual(status, 'inactive')
+            self.assertNotIn('squid', self.monitor._units)
+            
+            # The next check retries D-Bus
+            mock_unit.side_effect = None
+            is_active, status = self.monitor.check_service_status('squid')
+            self.assertTrue(is_active)
+            self.assertEqual(mock_popen.call_count, 1)
+        
+    @patch('os.killpg')
+    @patch('subprocess.Popen')
+    def test_check_service_timeout(self, mock_popen, mock_killpg):
+        """Test service check timeout kills the systemctl process group"""
+        import signal
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.pid = 4242
+        proc.communicate.side_effect = [subprocess.TimeoutExpired('systemctl', 10), ('', '')]
         
         is_active, status = self.monitor.check_service_status('squid')
         
+        mock_killpg.assert_called_once_with(4242, signal.SIGKILL)
+        self.assertEqual(proc.communicate.call_count, 2)
         self.assertFalse(is_active)
         self.assertEqual(status, 'timeout')
         
-    @patch('builtins.open', create=True)
-    def test_get_system_stats(self, mock_open):
+    @patch('os.pread')
+    def test_get_system_stats(self, mock_pread):
         """Test system statistics gathering"""
-        # Mock /proc/stat
-        stat_content = "cpu 100 0 100 300 0 0 0 0 0 0\n"
-        # Mock /proc/meminfo
-        meminfo_content = "MemTotal: 1000 kB\nMemAvailable: 400 kB\n"
-        
-        mock_open.side_effect = [
-            MagicMock(read=lambda: stat_content, __enter__=lambda s: s, __exit__=lambda *args: None),
-            MagicMock(read=lambda: [line + '\n' for line in meminfo_content.split('\n')[:-1]], 
-                     readlines=lambda: [line + '\n' for line in meminfo_content.split('\n')[:-1]],
-                     __enter__=lambda s: s, __exit__=lambda *args: None)
+        # /proc/stat is read first, then /proc/meminfo
+        mock_pread.side_effect = [
+            b"cpu 100 0 100 300 0 0 0 0 0 0\ncpu0 100 0 100 300 0 0 0 0 0 0\n",
+            b"MemTotal: 1000 kB\nMemFree: 100 kB\nMemAvailable: 400 kB\n",
         ]
         
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = Mock(
-                returncode=0,
-                stdout="Filesystem Size Used Avail Use% Mounted\n/dev/sda1 100G 60G 40G 60% /"
-            )
+        # 595 blocks used, 400 available to unprivileged users
+        with patch('os.statvfs') as mock_statvfs:
+            mock_statvfs.return_value = Mock(f_blocks=1050, f_bfree=455, f_bavail=400)
             
             stats = self.monitor.get_system_stats()
             
-            self.assertIn('cpu_usage', stats)
-            self.assertIn('memory_usage', stats)
+            self.assertEqual(stats['cpu_usage'], 40.0)
+            self.assertEqual(stats['memory_usage'], 60.0)
             self.assertEqual(stats['disk_usage'], '60%')
+        
+        # Only the head of each /proc file is read
+        self.assertEqual([c.args[1] for c in mock_pread.call_args_list], [256, 256])
+            
+    def test_get_system_stats_cached(self):
+        """Test statistics are reused within the cache TTL"""
+        from squid_monitor import STATS_CACHE_TTL
+        clock = [1000.0]
+        
+        with patch('time.monotonic', side_effect=lambda: clock[0]), \
+             patch.object(self.monitor, '_read_cpu', return_value=12.5) as mock_cpu, \
+             patch.object(self.monitor, '_read_memory', return_value=50.0), \
+             patch.object(self.monitor, '_read_disk', return_value='42%'):
+            first = self.monitor.get_system_stats()
+            clock[0] += STATS_CACHE_TTL - 1
+            self.assertEqual(self.monitor.get_system_stats(), first)
+            self.assertEqual(mock_cpu.call_count, 1)
             
-    @patch('subprocess.run')
-    def test_get_recent_logs(self, mock_run):
+            clock[0] += 1
+            self.monitor.get_system_stats()
+            self.assertEqual(mock_cpu.call_count, 2)
+        
+    def test_get_system_stats_concurrent(self):
+        """Test statistics gathered through an executor"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with patch.object(self.monitor, '_read_cpu', return_value=12.5), \
+             patch.object(self.monitor, '_read_memory', side_effect=OSError('unavailable')), \
+             patch.object(self.monitor, '_read_disk', return_value='42%'), \
+             ThreadPoolExecutor(max_workers=3) as executor:
+            stats = self.monitor.get_system_stats(executor)
+        
+        self.assertEqual(stats, {'cpu_usage': 12.5, 'memory_usage': 'N/A', 'disk_usage': '42%'})
+        
+    @patch('subprocess.Popen')
+    def test_get_recent_logs(self, mock_popen):
         """Test retrieving recent service logs"""
         mock_logs = "Jan 01 00:00:00 server squid[1234]: Starting...\n"
-        mock_run.return_value = Mock(returncode=0, stdout=mock_logs)
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.stdout.read.return_value = mock_logs.encode()
+        proc.wait.return_value = 0
         
         logs = self.monitor.get_recent_logs('squid')
         
         self.assertEqual(logs, mock_logs)
-        mock_run.assert_called_with(
+        mock_popen.assert_called_with(
             ['journalctl', '-u', 'squid', '-n', '50', '--no-pager'],
-            capture_output=True,
-            text=True,
-            timeout=10
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
         )
+        proc.terminate.assert_not_called()
+        
+    @patch('subprocess.Popen')
+    def test_get_recent_logs_cached_per_check(self, mock_popen):
+        """Test journalctl runs once per check for the same query"""
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.stdout.read.return_value = b"Starting...\n"
+        proc.wait.return_value = 0
+        
+        self.monitor.get_recent_logs('squid')
+        self.monitor.get_recent_logs('squid')
+        self.assertEqual(mock_popen.call_count, 1)
+        
+        # A new check starts with an empty cache
+        self.state_manager.should_send_alert.return_value = False
+        with patch.object(self.monitor, 'check_service_status', return_value=(True, 'active')):
+            self.monitor.run_check()
+        self.monitor.get_recent_logs('squid')
+        self.assertEqual(mock_popen.call_count, 2)
+        
+    @patch('subprocess.Popen')
+    def test_get_recent_logs_truncated(self, mock_popen):
+        """Test oversized log output is capped and the reader stopped"""
+        from squid_monitor import MAX_LOG_BYTES
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.stdout.read.return_value = b'x' * MAX_LOG_BYTES
+        proc.wait.return_value = -15
+        
+        logs = self.monitor.get_recent_logs('squid')
+        
+        proc.stdout.read.assert_called_once_with(MAX_LOG_BYTES)
+        proc.kill.assert_called_once()
+        self.assertTrue(logs.startswith('x' * 100))
+        self.assertIn('truncated', logs)
+        
+    def test_get_recent_logs_truncated_signals_blocked(self):
+        """Test a capped reader is stopped promptly under the main loop's signal mask"""
+        import signal
+        from squid_monitor import LOOP_SIGNALS
+        real_popen = subprocess.Popen
+        writer = [sys.executable, '-c', 'import sys\nwhile True: sys.stdout.write("x" * 4096)']
+        
+        previous = signal.pthread_sigmask(signal.SIG_BLOCK, LOOP_SIGNALS)
+        self.addCleanup(signal.pthread_sigmask, signal.SIG_SETMASK, previous)
+        with patch('subprocess.Popen', side_effect=lambda args, **kwargs: real_popen(writer, **kwargs)):
+            started = time.monotonic()
+            logs = self.monitor.get_recent_logs('squid')
+        
+        self.assertIn('truncated', logs)
+        self.assertLess(time.monotonic() - started, 5)
         
     def test_create_alert_content_failure(self):
         """Test creating failure alert content"""
         with patch.object(self.monitor, 'get_system_stats') as mock_stats:
             with patch.object(self.monitor, 'get_recent_logs') as mock_logs:
                 mock_stats.return_value = {'cpu_usage': 50, 'memory_usage': 60, 'disk_usage': '70%'}
-                mock_logs.return_value = "Test logs"
+                mock_logs.return_value = "Test logs {with braces} and $dollars"
                 
                 subject, text, html = self.monitor.create_alert_content('squid', 'inactive', False)
                 
                 self.assertIn('[ALERT]', subject)
                 self.assertIn('FAILURE', text)
                 self.assertIn('#dc3545', html)  # Red color
+                self.assertIn('.header { background-color: #dc3545;', html)
+                self.assertIn('Test logs {with braces} and $dollars', text)
                 
     def test_create_alert_content_recovery(self):
         """Test creating recovery alert content"""
@@ -256,69 +611,318 @@ class TestServiceMonitor(unittest.TestCase):
                 self.assertIn('RECOVERY', text)
                 self.assertIn('#28a745', html)  # Green color
                 
+    def test_alert_context_executor_reused(self):
+        """Test alert context gathering reuses one worker pool until close"""
+        with patch.object(self.monitor, 'get_system_stats', return_value={}), \
+             patch.object(self.monitor, 'get_recent_logs', return_value=''):
+            self.monitor.create_alert_content('squid', 'inactive')
+            executor = self.monitor._executor
+            self.monitor.create_alert_content('squid', 'active', True)
+        
+        self.assertIs(self.monitor._executor, executor)
+        self.monitor.close()
+        self.assertIsNone(self.monitor._executor)
+        
     @patch('smtplib.SMTP')
     def test_send_email_alert(self, mock_smtp):
         """Test sending email alerts"""
-        mock_server = Mock()
-        mock_smtp.return_value.__enter__.return_value = mock_server
+        mock_server = mock_smtp.return_value
         
         result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
         
         self.assertTrue(result)
         mock_server.send_message.assert_called_once()
+        self.assertEqual(mock_server.send_message.call_args.kwargs['to_addrs'],
+                         self.config.smtp.to_addresses)
+        
+    @patch('smtplib.SMTP')
+    def test_send_email_retry_keeps_connection(self, mock_smtp):
+        """Test a server error reply is retried on the same connection"""
+        import smtplib
+        mock_server = mock_smtp.return_value
+        mock_server.noop.return_value = (250, b'OK')
+        mock_server.send_message.side_effect = [smtplib.SMTPDataError(451, b'Try again later'), None]
+        
+        with patch('time.sleep'):
+            result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
+        
+        self.assertTrue(result)
+        self.assertEqual(mock_smtp.call_count, 1)
+        mock_server.close.assert_not_called()
+        
+    @patch('smtplib.SMTP')
+    def test_send_email_reuses_connection(self, mock_smtp):
+        """Test SMTP connection is reused across alerts"""
+        mock_server = mock_smtp.return_value
+        mock_server.noop.return_value = (250, b'OK')
+        
+        self.monitor.send_email_alert('First', 'Test Body', '<html>Test</html>')
+        self.monitor.send_email_alert('Second', 'Test Body', '<html>Test</html>')
+        
+        self.assertEqual(mock_smtp.call_count, 1)
+        self.assertEqual(mock_server.send_message.call_count, 2)
+        mock_server.noop.assert_called_once()
+        
+    @patch('smtplib.SMTP')
+    def test_send_email_reconnects_stale_connection(self, mock_smtp):
+        """Test a failed NOOP probe triggers a reconnect"""
+        import smtplib
+        mock_server = mock_smtp.return_value
+        mock_server.noop.side_effect = smtplib.SMTPServerDisconnected()
+        
+        self.monitor.send_email_alert('First', 'Test Body', '<html>Test</html>')
+        self.monitor.send_email_alert('Second', 'Test Body', '<html>Test</html>')
+        
+        self.assertEqual(mock_smtp.call_count, 2)
+        
+    @patch('smtplib.SMTP')
+    def test_smtp_circuit_breaker(self, mock_smtp):
+        """Test email stops after consecutive failed alerts until the cooldown passes"""
+        mock_smtp.side_effect = Exception("Connection refused")
+        
+        with patch('time.sleep'):
+            for _ in range(3):
+                self.assertFalse(self.monitor.send_email_alert('Subject', 'Body', '<html></html>'))
+        
+        # Third alert is skipped without dialing
+        self.assertEqual(mock_smtp.call_count, 6)
+        
+        # After the cooldown one failed alert reopens the circuit
+        cooldown = self.monitor.config.monitoring.alert_cooldown
+        self.monitor._smtp_circuit_opened -= cooldown
+        with patch('time.sleep'):
+            for _ in range(2):
+                self.assertFalse(self.monitor.send_email_alert('Subject', 'Body', '<html></html>'))
+        self.assertEqual(mock_smtp.call_count, 9)
+        
+        # After the next cooldown a successful alert closes it
+        mock_smtp.side_effect = None
+        self.monitor._smtp_circuit_opened -= cooldown
+        self.assertTrue(self.monitor.send_email_alert('Subject', 'Body', '<html></html>'))
+        self.assertEqual(self.monitor._smtp_consecutive_failures, 0)
+        
+    @patch('smtplib.SMTP')
+    def test_smtp_server_dns_cached(self, mock_smtp):
+        """Test the SMTP server address is resolved once within its TTL"""
+        self.config.smtp = replace(self.config.smtp, dns_cache=True)
+        answer = MagicMock()
+        answer.__getitem__.return_value.to_text.return_value = '192.0.2.10'
+        answer.rrset.ttl = 300
+        mock_dns = MagicMock()
+        mock_dns.resolver.resolve.return_value = answer
+        mock_smtp.return_value.noop.return_value = (421, b'Closing')
+        
+        # dnspython is optional; stand in for it
+        with patch.dict(sys.modules, {'dns': mock_dns, 'dns.resolver': mock_dns.resolver}):
+            self.monitor.send_email_alert('First', 'Test Body', '<html>Test</html>')
+            self.monitor.send_email_alert('Second', 'Test Body', '<html>Test</html>')
+        
+        mock_dns.resolver.resolve.assert_called_once_with('smtp.example.com', 'A')
+        mock_smtp.return_value.connect.assert_called_with('192.0.2.10', 25)
+        self.assertEqual(mock_smtp.return_value._host, 'smtp.example.com')
+        
+    @patch('smtplib.SMTP')
+    def test_smtp_server_system_resolver_by_default(self, mock_smtp):
+        """Test the SMTP server name goes to the system resolver unless opted in"""
+        mock_dns = MagicMock()
+        
+        with patch.dict(sys.modules, {'dns': mock_dns, 'dns.resolver': mock_dns.resolver}):
+            self.monitor.send_email_alert('Subject', 'Test Body', '<html>Test</html>')
+        
+        mock_dns.resolver.resolve.assert_not_called()
+        mock_smtp.return_value.connect.assert_called_with('smtp.example.com', 25)
         
     def test_send_email_alert_dry_run(self):
         """Test email sending in dry run mode"""
-        self.monitor.config['features']['dry_run'] = True
+        self.config.features = replace(self.config.features, dry_run=True)
         
-        result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
+        with patch('email.mime.multipart.MIMEMultipart') as mock_mime:
+            result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
         
         self.assertTrue(result)
+        mock_mime.assert_not_called()
         # Logger should be called for dry run
-        self.logger.log.assert_called()
+        self.logger.info.assert_called()
         
     @patch('smtplib.SMTP')
     def test_send_email_retry(self, mock_smtp):
         """Test email retry logic"""
         # First two attempts fail, third succeeds
-        mock_smtp.return_value.__enter__.side_effect = [
+        mock_smtp.return_value.send_message.side_effect = [
             Exception("Connection failed"),
             Exception("Connection failed"),
-            Mock()
+            None
         ]
         
-        with patch('time.sleep'):  # Don't actually sleep in tests
+        with patch('time.sleep') as mock_sleep:  # Don't actually sleep in tests
+            result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
+        
+        # Backoff doubles from retry_delay, plus up to half a second of jitter
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(5 <= delays[0] <= 5.5)
+        self.assertTrue(10 <= delays[1] <= 10.5)
+        
+        # Should succeed on the third attempt, reconnecting after each failure
+        self.assertTrue(result)
+        self.assertEqual(mock_smtp.call_count, 3)
+        sent = [c.args[0] for c in mock_smtp.return_value.send_message.call_args_list]
+        self.assertTrue(all(msg is sent[0] for msg in sent))
+        
+    @patch('smtplib.SMTP')
+    def test_send_email_retry_deadline(self, mock_smtp):
+        """Test retries stop when the backoff would overrun the next check"""
+        self.config.monitoring = replace(self.config.monitoring, check_interval=60, retry_delay=40)
+        mock_smtp.return_value.send_message.side_effect = Exception("Connection failed")
+        
+        clock = [1000.0]
+        
+        def advance(seconds):
+            clock[0] += seconds
+        
+        with patch('time.monotonic', side_effect=lambda: clock[0]), \
+             patch('time.sleep', side_effect=advance) as mock_sleep:
+            result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
+        
+        # 30s (capped) is within budget, the following 30s is not
+        self.assertFalse(result)
+        self.assertEqual(mock_smtp.call_count, 2)
+        mock_sleep.assert_called_once()
+        self.assertTrue(30 <= mock_sleep.call_args.args[0] <= 30.5)
+        
+    @patch('smtplib.SMTP')
+    def test_send_email_retry_exhausted(self, mock_smtp):
+        """Test email failure after all retries"""
+        mock_smtp.side_effect = Exception("Connection failed")
+        
+        with patch('time.sleep'):
             result = self.monitor.send_email_alert('Test Subject', 'Test Body', '<html>Test</html>')
         
-        # Should still fail after retries
         self.assertFalse(result)
         self.assertEqual(mock_smtp.call_count, 3)
 
 
+    def test_webhook_session_reused(self):
+        """Test webhook deliveries share one HTTP session"""
+        self.config.features = replace(self.config.features, webhook_url='https://hooks.example.com/alert')
+        session = Mock()
+        session.post.return_value = Mock(status_code=200)
+        
+        with patch.object(self.monitor, '_get_http', return_value=session):
+            self.monitor.send_webhook_alert('squid', False, 'inactive')
+            self.monitor.send_webhook_alert('squid', True, 'active')
+        
+        self.assertEqual(session.post.call_count, 2)
+        self.assertEqual(session.post.call_args[0][0], 'https://hooks.example.com/alert')
+        
+    def test_http_session_cached(self):
+        """Test the HTTP session is created once"""
+        try:
+            import requests  # noqa: F401
+        except ImportError:
+            self.skipTest("requests not installed")
+        
+        self.assertIs(self.monitor._get_http(), self.monitor._get_http())
+
+
+class TestPipelinedSMTP(unittest.TestCase):
+    """Test SMTP command pipelining"""
+    
+    def setUp(self):
+        self.server = PipelinedSMTP()
+        self.server.ehlo_resp = b'ok'
+        self.server.does_esmtp = True
+        self.server.send = Mock()
+        self.server.getreply = Mock()
+        
+    def test_envelope_sent_in_one_write(self):
+        """Test MAIL/RCPT/DATA are batched when PIPELINING is advertised"""
+        self.server.esmtp_features = {'pipelining': ''}
+        self.server.getreply.side_effect = [
+            (250, b'OK'), (250, b'OK'), (250, b'OK'), (354, b'Go'), (250, b'Queued')
+        ]
+        
+        senderrs = self.server.sendmail(
+            'from@example.com', ['a@example.com', 'b@example.com'], b'Subject: x\r\n\r\n.body'
+        )
+        
+        self.assertEqual(senderrs, {})
+        self.assertEqual(self.server.send.call_count, 2)
+        envelope = self.server.send.call_args_list[0][0][0]
+        self.assertEqual(envelope.count('\r\n'), 4)
+        self.assertTrue(envelope.startswith('mail FROM:<from@example.com>'))
+        self.assertEqual(self.server.send.call_args_list[1][0][0],
+                         b'Subject: x\r\n\r\n..body\r\n.\r\n')
+        
+    def test_recipients_refused(self):
+        """Test all recipients refused raises after draining replies"""
+        import smtplib
+        self.server.esmtp_features = {'pipelining': ''}
+        self.server.getreply.side_effect = [(250, b'OK'), (550, b'No'), (554, b'No valid rcpt')]
+        self.server._rset = Mock()
+        
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            self.server.sendmail('from@example.com', ['a@example.com'], b'body')
+        self.assertEqual(self.server.send.call_count, 1)
+        
+    def test_fallback_without_pipelining(self):
+        """Test servers without PIPELINING use the serial exchange"""
+        self.server.esmtp_features = {}
+        
+        with patch('smtplib.SMTP.sendmail', return_value={}) as mock_sendmail:
+            self.server.sendmail('from@example.com', ['a@example.com'], b'body')
+            mock_sendmail.assert_called_once()
+
+
 class TestIntegration(unittest.TestCase):
     """Integration tests"""
     
     def setUp(self):
-        self.temp_dir = tempfile.mkdtemp()
-        self.state_file = os.path.join(self.temp_dir, 'state.json')
+        temp_dir = tempfile.TemporaryDirectory(dir=STATE_DIR)
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.state_file = os.path.join(self.temp_dir, 'state.bin')
         os.environ['STATE_FILE'] = self.state_file
+        os.environ['LOG_FILE'] = os.path.join(self.temp_dir, 'monitor.log')
         os.environ['DRY_RUN'] = 'true'
         os.environ['LOG_LEVEL'] = 'ERROR'  # Reduce noise in tests
         
     def tearDown(self):
         # Cleanup environment
-        for key in ['STATE_FILE', 'DRY_RUN', 'LOG_LEVEL']:
+        for key in ['STATE_FILE', 'LOG_FILE', 'DRY_RUN', 'LOG_LEVEL']:
             if key in os.environ:
                 del os.environ[key]
                 
-    @patch('subprocess.run')
-    def test_full_monitoring_cycle(self, mock_run):
+    def test_reload_releases_resources(self):
+        """Test repeated reloads do not accumulate open file descriptors"""
+        import argparse
+        from squid_monitor import build_monitor, reload_monitor
+        args = argparse.Namespace(config=None, dry_run=False, debug=False)
+        
+        with patch.dict(os.environ, {'ENABLE_SYSLOG': 'false'}):
+            monitor = build_monitor(args)
+            monitor = reload_monitor(monitor, args)
+            open_fds = len(os.listdir('/proc/self/fd'))
+            for _ in range(5):
+                monitor = reload_monitor(monitor, args)
+        
+        self.assertEqual(len(os.listdir('/proc/self/fd')), open_fds)
+        monitor.close()
+        monitor.state_manager.close()
+        
+    @patch('squid_monitor.SystemdUnit', None)
+    @patch('subprocess.Popen')
+    def test_full_monitoring_cycle(self, mock_popen):
         """Test complete monitoring cycle"""
-        # Service is down
-        mock_run.return_value = Mock(returncode=3, stdout='inactive')
+        # Service is down; systemctl and journalctl share the Popen mock
+        proc = mock_popen.return_value.__enter__.return_value
+        proc.communicate.return_value = ('inactive\n', '')
+        proc.returncode = 3
+        proc.stdout.read.return_value = b''
+        proc.wait.return_value = 0
         
         config = Config()
-        logger = Logger(config.config)
+        logger = Logger(config)
         state_manager = StateManager(self.state_file)
         monitor = ServiceMonitor(config, logger, state_manager)
         
@@ -337,7 +941,8 @@ class TestIntegration(unittest.TestCase):
             mock_email.assert_not_called()
             
         # Service recovers
-        mock_run.return_value = Mock(returncode=0, stdout='active')
+        proc.communicate.return_value = ('active\n', '')
+        proc.returncode = 0
         
         # Recovery check - should alert
         with patch.object(monitor, 'send_email_alert', return_value=True) as mock_email: